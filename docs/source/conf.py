@@ -8,7 +8,9 @@ from docutils import nodes
 from sphinx import addnodes
 from sphinx.transforms.post_transforms import SphinxPostTransform
 import re, pathlib, sys
-sys.path.insert(0, pathlib.Path(__file__).resolve().parents[2].as_posix())
+_PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[2].as_posix()
+if _PROJECT_ROOT not in sys.path:                      # conf may be re‑executed
+    sys.path.insert(0, _PROJECT_ROOT)
 
 extensions = [
     "sphinx.ext.autodoc",
@@ -24,79 +26,75 @@ source_suffix = {".rst": "restructuredtext", ".md": "markdown"}
 html_theme = "sphinx_rtd_theme"
 
 # ── 1. Pre‑processing the source (Python side) ────────────────────────────
-_CTRL  = re.compile(r"[\x00-\x08\x0B-\x1F]")          # C0 except TAB/LF/CR
+_CTRL  = re.compile(r"[\x00-\x08\x0B-\x1F]", re.ASCII) # C0 except TAB/LF/CR
 _ARROWS = {"➔": r"$\rightarrow$"}                     # extend as needed
+# One alternation for both jobs, longest glyphs first: a single scan and
+# a single output buffer per document.  re.sub hands back the original
+# string untouched when nothing matches, so clean docs cost one search.
+_CLEAN_RE = re.compile("|".join(
+    [_CTRL.pattern] + [re.escape(k) for k in sorted(_ARROWS, key=len, reverse=True)]
+), re.ASCII)
+_CLEAN_SUB  = _CLEAN_RE.sub                             # pre‑bound: hot per doc
+_ARROWS_GET = _ARROWS.get                               # pre‑bound: hot per match
+# Pure‑ASCII sources (most of them) can't hold the glyphs, so they only need
+# the control bytes deleted -- str.translate does that in C, well ahead of
+# the regex.  On non‑ASCII text translate drops to a per‑char dict lookup
+# and loses badly, so those keep the fused regex.
+_CTRL_TABLE = dict.fromkeys([*range(0x00, 0x09), *range(0x0B, 0x20)])
+_ASCII_FAST = not any(k.isascii() for k in _ARROWS)
+
+def _dispatch(m):
+    """Control byte -> ``""``; glyph -> its ``_ARROWS`` replacement."""
+    return _ARROWS_GET(m.group(0), "")
 
 def _clean(app, docname, source):
     """Strip stray control bytes & tame exotic glyphs before LaTeX sees them."""
-    if app.builder.name != "latex":
-        return
-    txt = _CTRL.sub("", source[0])                     # kill ^H, ^K, …
-    for bad, good in _ARROWS.items():
-        txt = txt.replace(bad, good)                   # swap fancy arrows
-    source[0] = txt
+    txt = source[0]
+    if _ASCII_FAST and txt.isascii():                  # O(1) flag check
+        source[0] = txt.translate(_CTRL_TABLE)         # kill ^H, ^K, …
+    else:
+        source[0] = _CLEAN_SUB(_dispatch, txt)         # … and swap ➔
+
+# Display‑math node classes; addnodes.displaymath only exists on Sphinx < 4.
+_MATH_TYPES = (nodes.math_block,) + (
+    (addnodes.displaymath,) if hasattr(addnodes, "displaymath") else ()
+)
 
 def _nowrap_all_math(app, doctree, docname):
     """Tell Sphinx‑LaTeX to typeset every display equation with ``\[ … \]``."""
-    if app.builder.name != "latex":
+    # The math domain already records, at read time, which docs hold any
+    # math; with none in the project there is nothing to walk.
+    if not app.env.get_domain("math").has_equations():
         return
+    # Pass node *classes*, one per call: docutils then takes its
+    # isinstance fast path instead of calling a Python predicate per node.
+    # findall() is a lazy iterator (docutils ≥ 0.18); traverse() is the
+    # list‑building fallback for older docutils.
+    findall = getattr(doctree, "findall", doctree.traverse)
+    for cls in _MATH_TYPES:
+        for nd in findall(cls):
+            nd["nowrap"] = True
 
-    has_displaymath = hasattr(addnodes, "displaymath")
-
-    def is_math(node):
-        """True for docutils *or* Sphinx display‑math nodes."""
-        return (
-            isinstance(node, nodes.math_block) or
-            (has_displaymath and isinstance(node, addnodes.displaymath))
-        )
 
-    # Give traverse() a *callable*, not a tuple,
-    # so there’s no ambiguity.
-    for nd in doctree.traverse(is_math):
-        nd["nowrap"] = True
+def _register_latex_hooks(app):
+    """Wire the LaTeX‑only hooks once the builder is known (HTML skips them)."""
+    if app.builder.name != "latex":
+        return
+    app.connect("source-read", _clean)
+    app.connect("doctree-resolved", _nowrap_all_math)
 
 
 def setup(app):
-    app.connect("source-read", _clean)
-    app.connect("doctree-resolved", _nowrap_all_math)
+    app.connect("builder-inited", _register_latex_hooks)
 
 # ── 2. LaTeX / PDF tweaks (TeX side) ───────────────────────────────────────
 latex_engine = "xelatex"
 
-latex_elements = {
-    "preamble": r"""
-% ----------------------------------------------------------------------
-%  A.  Map troublesome Unicode characters to safe TeX equivalents
-% ----------------------------------------------------------------------
-\usepackage{newunicodechar}
-\newunicodechar{‒}{\textendash}         % figure dash
-\newunicodechar{–}{\textendash}         % en‑dash
-\newunicodechar{—}{\textemdash}         % em‑dash
-\newunicodechar{‑}{-}                   % non‑breaking hyphen
-\newunicodechar{ }{\nobreakspace}       % NBSP (U+00A0)
-\newunicodechar{ }{\,}                  % narrow NBSP (U+202F)
-\newunicodechar{•}{\textbullet}         % bullet
-\newunicodechar{▸}{\textbullet}         % small triangle bullet
-\newunicodechar{→}{\textrightarrow}     % U+2192
-\newunicodechar{↔}{\textleftrightarrow} % U+2194
-\newunicodechar{↦}{\ensuremath{\mapsto}}% U+21A6
-\newunicodechar{⟶}{\textrightarrow}     % U+27F6
-\newunicodechar{♯}{\#}                  % music sharp = hash
-\newunicodechar{∗}{\ensuremath{\ast}}   % math star
-% Add more with \newunicodechar{<char>}{<replacement>} as needed.
+# Unicode map + longtable catcode fixes live in _latex/unicodemap.sty.
+_LATEX_PREAMBLE = r"\usepackage{unicodemap}"
+latex_additional_files = ["_latex/unicodemap.sty"]
 
-% ----------------------------------------------------------------------
-%  B.  Keep #, &, _ literals from breaking longtable’s internal macros
-% ----------------------------------------------------------------------
-\usepackage{etoolbox}
-\makeatletter
-\AtBeginEnvironment{longtable}{%
-  \catcode`\#=12 \catcode`\&=12 \catcode`\_=12
-}
-\AtEndEnvironment{longtable}{%
-  \catcode`\#=6  \catcode`\&=4  \catcode`\_=8
-}
-\makeatother
-"""
+latex_elements = {
+    "preamble": _LATEX_PREAMBLE,
     # You can add more LaTeX keys here (e.g. 'sphinxsetup', 'figure_align', ...)
 }